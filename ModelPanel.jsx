@@ -1,8 +1,12 @@
 import { useEffect, useMemo, useRef, useState } from 'react';
 import * as THREE from 'three';
 import { GLTFLoader } from 'three/examples/jsm/loaders/GLTFLoader.js';
+import { DRACOLoader } from 'three/examples/jsm/loaders/DRACOLoader.js';
 import { OrbitControls } from 'three/examples/jsm/controls/OrbitControls.js';
 
+// Декодер копируется из three/examples/jsm/libs/draco/gltf в public/draco при npm install
+const DRACO_DECODER_PATH = '/draco/';
+
 function emissiveByLamp(lamp) {
   if (!lamp) return '#3a3a3a';
   if (!lamp.cassettePresent) return '#1d1d1d';
@@ -367,7 +371,11 @@ export function ModelPanel({ lamp, droneStatus, ambientTemp }) {
     scene.add(insertionCassette);
 
     let importedDrone = null;
+    // drone.glb экспортируется с Draco-сжатием геометрии
+    const dracoLoader = new DRACOLoader();
+    dracoLoader.setDecoderPath(DRACO_DECODER_PATH);
     const loader = new GLTFLoader();
+    loader.setDRACOLoader(dracoLoader);
     loader.load(
       '/models/drone.glb',
       (gltf) => {
@@ -518,6 +526,7 @@ export function ModelPanel({ lamp, droneStatus, ambientTemp }) {
       cancelAnimationFrame(rafRef.current);
       resizeObserver.disconnect();
       controls.dispose();
+      dracoLoader.dispose();
       if (importedDrone) modelAnchor.remove(importedDrone);
       renderer.dispose();
       mountRef.current?.removeChild(renderer.domElement);
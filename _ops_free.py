@@ -0,0 +1,163 @@
+# Построение сцены через bpy.data без bpy.ops: операторы платят за настройку контекста
+# и depsgraph-апдейт на каждый вызов, а объекты, созданные напрямую, возвращаются сразу.
+import bmesh
+import bpy
+import numpy as np
+from mathutils import Matrix
+
+
+_UNIT_CUBE_VERTS = np.array([
+    (-0.5, -0.5, -0.5),
+    (0.5, -0.5, -0.5),
+    (0.5, 0.5, -0.5),
+    (-0.5, 0.5, -0.5),
+    (-0.5, -0.5, 0.5),
+    (0.5, -0.5, 0.5),
+    (0.5, 0.5, 0.5),
+    (-0.5, 0.5, 0.5),
+], dtype=np.float32)
+
+_UNIT_CUBE_FACES = np.array([
+    (0, 3, 2, 1),
+    (4, 5, 6, 7),
+    (0, 1, 5, 4),
+    (1, 2, 6, 5),
+    (2, 3, 7, 6),
+    (3, 0, 4, 7),
+], dtype=np.int32)
+
+
+def make_cube_mesh(name):
+    me = bpy.data.meshes.new(name)
+    n_faces, n_corners = _UNIT_CUBE_FACES.shape
+
+    me.vertices.add(len(_UNIT_CUBE_VERTS))
+    me.vertices.foreach_set('co', _UNIT_CUBE_VERTS.ravel())
+    me.loops.add(_UNIT_CUBE_FACES.size)
+    me.loops.foreach_set('vertex_index', _UNIT_CUBE_FACES.ravel())
+    me.polygons.add(n_faces)
+    me.polygons.foreach_set('loop_start', np.arange(0, _UNIT_CUBE_FACES.size, n_corners, dtype=np.int32))
+    # В Blender 4.x loop_total только для чтения и выводится из loop_start
+    if not me.polygons.bl_rna.properties['loop_total'].is_readonly:
+        me.polygons.foreach_set('loop_total', np.full(n_faces, n_corners, dtype=np.int32))
+    me.update(calc_edges=True)
+    return me
+
+
+# Общие (linked) меши: одинаковые примитивы отличаются только трансформом и материалом
+_MESH_CACHE = {}
+
+
+def clear_cache():
+    _MESH_CACHE.clear()
+
+
+def _shared_mesh(key, build):
+    me = _MESH_CACHE.get(key)
+    if me is None:
+        me = build()
+        # Пустой слот, который объекты заполняют своим материалом (link='OBJECT')
+        me.materials.append(None)
+        _MESH_CACHE[key] = me
+    return me
+
+
+def _cone_mesh(name, r1, r2, depth, vertices):
+    me = bpy.data.meshes.new(name)
+    bm = bmesh.new()
+    bmesh.ops.create_cone(bm, cap_ends=True, segments=vertices, radius1=r1, radius2=r2, depth=depth)
+    bm.to_mesh(me)
+    bm.free()
+    return me
+
+
+def _link_mesh_object(name, mesh, location, rotation=(0, 0, 0), scale=(1, 1, 1), material=None):
+    obj = bpy.data.objects.new(name, mesh)
+    bpy.context.collection.objects.link(obj)
+    obj.location = location
+    obj.rotation_euler = rotation
+    obj.scale = scale
+    if material:
+        slot = obj.material_slots[0]
+        slot.link = 'OBJECT'
+        slot.material = material
+    return obj
+
+
+def new_cube(name, size, loc, mat=None):
+    me = _shared_mesh(('cube',), lambda: make_cube_mesh('unit_cube'))
+    return _link_mesh_object(name, me, loc, scale=size, material=mat)
+
+
+def new_cyl(name, r, d, loc, rot=(0, 0, 0), mat=None, verts=32):
+    me = _shared_mesh(
+        ('cylinder', verts),
+        lambda: _cone_mesh(f'unit_cyl_{verts}', 1.0, 1.0, 1.0, verts),
+    )
+    return _link_mesh_object(name, me, loc, rot, (r, r, d), mat)
+
+
+def new_camera(name, loc, rot):
+    obj = bpy.data.objects.new(name, bpy.data.cameras.new(name))
+    bpy.context.collection.objects.link(obj)
+    obj.location = loc
+    obj.rotation_euler = rot
+    return obj
+
+
+def new_area_light(name, loc, energy, size):
+    light = bpy.data.lights.new(name, type='AREA')
+    light.energy = energy
+    light.size = size
+    obj = bpy.data.objects.new(name, light)
+    bpy.context.collection.objects.link(obj)
+    obj.location = loc
+    return obj
+
+
+class MeshAssembly:
+    """Собирает несколько примитивов в один bmesh; материал задается индексом на гранях."""
+
+    def __init__(self):
+        self.bm = bmesh.new()
+        # material -> material_index; порядок вставки задает порядок слотов меша
+        self.slots = {}
+
+    def _tag(self, verts, material):
+        index = self.slots.setdefault(material, len(self.slots))
+        for face in {f for v in verts for f in v.link_faces}:
+            face.material_index = index
+
+    def add_cube(self, size, location, material):
+        self.add_cubes(size, [location], material)
+
+    def add_cubes(self, size, positions, material):
+        scale = Matrix.Diagonal(size).to_4x4()
+        verts = []
+        for pos in positions:
+            ret = bmesh.ops.create_cube(self.bm, size=1.0, matrix=scale)
+            bmesh.ops.translate(self.bm, vec=pos, verts=ret['verts'])
+            verts.extend(ret['verts'])
+        self._tag(verts, material)
+
+    def add_cylinders(self, radius, depth, positions, material, vertices=32):
+        self.add_cones(radius, radius, depth, positions, material, vertices)
+
+    def add_cones(self, r1, r2, depth, positions, material, vertices=24):
+        verts = []
+        for pos in positions:
+            ret = bmesh.ops.create_cone(
+                self.bm, cap_ends=True, segments=vertices, radius1=r1, radius2=r2, depth=depth
+            )
+            bmesh.ops.translate(self.bm, vec=pos, verts=ret['verts'])
+            verts.extend(ret['verts'])
+        self._tag(verts, material)
+
+    def to_object(self, name, location=(0, 0, 0), scale=(1, 1, 1)):
+        me = bpy.data.meshes.new(name)
+        # Слоты заполняются до to_mesh и до появления объекта, один раз на меш
+        for mat in self.slots:
+            me.materials.append(mat)
+        self.bm.to_mesh(me)
+        self.bm.free()
+        return _link_mesh_object(name, me, location, scale=scale)
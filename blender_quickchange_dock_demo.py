@@ -1,59 +1,104 @@
+# Переменные окружения:
+#   QUICKCHANGE_RENDER_PREVIEW — если задана (непустая), рендерится кадр-превью;
+#                                без нее сцена только собирается.
+#   QUICKCHANGE_RENDER_PERCENT — масштаб разрешения превью в процентах (по умолчанию 25).
+#
+# Путь для сохранения .blend передается после «--». Для headless-сборки без
+# пользовательских настроек:
+#   blender --background --factory-startup --python blender_quickchange_dock_demo.py -- quickchange_dock.blend
+#
+# Сцена собирается без bpy.ops (см. _ops_free.py, проверка — check_ops_free.py);
+# операторы остаются только для сохранения файла и рендера превью.
+#
+# Поддерживаемые версии Blender: 3.x–5.x. Анимация пишется через channelbag слота
+# действия (4.4+), на более старых версиях — через Action.fcurves.
 try:
     import bpy
 except ModuleNotFoundError as exc:
     raise SystemExit(
         "Этот скрипт нужно запускать только через Blender (модуль bpy доступен внутри Blender).\n"
-        "Пример: blender --python c:/Users/sqizman/drone-lamp-automation/scripts/blender_quickchange_dock_demo.py"
+        "Пример: blender --background --factory-startup --python blender_quickchange_dock_demo.py -- quickchange_dock.blend"
     ) from exc
 import math
+import os
+import sys
+import numpy as np
+from bpy_extras import anim_utils
 from mathutils import Vector
 
+# Blender не добавляет каталог скрипта в sys.path при запуске через --python
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _ops_free
+
 
 def clear_scene():
-    bpy.ops.object.select_all(action='SELECT')
-    bpy.ops.object.delete(use_global=False)
-    for block in bpy.data.meshes:
-        if block.users == 0:
-            bpy.data.meshes.remove(block)
+    for obj in list(bpy.data.objects):
+        bpy.data.objects.remove(obj, do_unlink=True)
+    for datablocks in (bpy.data.meshes, bpy.data.materials, bpy.data.actions,
+                       bpy.data.cameras, bpy.data.lights):
+        for block in list(datablocks):
+            if block.users == 0:
+                datablocks.remove(block)
+    _ops_free.clear_cache()
+    _MAT_CACHE.clear()
+
+
+# Материалы с одинаковыми (цвет, roughness, metallic) собираются один раз
+_MAT_CACHE = {}
+
+# Индексы сокетов Principled BSDF зависят от версии Blender (в 3.x Roughness = 9,
+# в 4.x = 2), поэтому они определяются по имени один раз на шаблонном узле.
+# Если сокет переименован, остается доступ по строке (и KeyError с понятным именем).
+_PBSDF_SOCKETS = {'base_color': 'Base Color', 'metallic': 'Metallic', 'roughness': 'Roughness'}
+_PBSDF_IDX = {}
+_MAT_TEMPLATE = None
+
+
+def _material_template():
+    global _MAT_TEMPLATE
+    if _MAT_TEMPLATE is None:
+        _MAT_TEMPLATE = bpy.data.materials.new(name='PrincipledTemplate')
+        _MAT_TEMPLATE.use_nodes = True
+        names = [socket.name for socket in _MAT_TEMPLATE.node_tree.nodes['Principled BSDF'].inputs]
+        _PBSDF_IDX.update({
+            key: names.index(name) if name in names else name
+            for key, name in _PBSDF_SOCKETS.items()
+        })
+    return _MAT_TEMPLATE
+
+
+def release_material_template():
+    # Шаблон нужен только на время make_material, в файле он не остается
+    global _MAT_TEMPLATE
+    if _MAT_TEMPLATE is not None:
+        bpy.data.materials.remove(_MAT_TEMPLATE)
+        _MAT_TEMPLATE = None
 
 
 def make_material(name, color, roughness=0.45, metallic=0.1):
-    mat = bpy.data.materials.new(name=name)
-    mat.use_nodes = True
-    bsdf = mat.node_tree.nodes.get('Principled BSDF')
-    if bsdf:
-        bsdf.inputs['Base Color'].default_value = (*color, 1.0)
-        bsdf.inputs['Roughness'].default_value = roughness
-        bsdf.inputs['Metallic'].default_value = metallic
+    key = tuple(round(v, 3) for v in (*color, roughness, metallic))
+    mat = _MAT_CACHE.get(key)
+    if mat is not None:
+        return mat
+
+    # Копия шаблона уже содержит дерево узлов — use_nodes не инициализируется заново
+    mat = _material_template().copy()
+    mat.name = name
+    inputs = mat.node_tree.nodes['Principled BSDF'].inputs
+    inputs[_PBSDF_IDX['base_color']].default_value = (*color, 1.0)
+    inputs[_PBSDF_IDX['roughness']].default_value = roughness
+    inputs[_PBSDF_IDX['metallic']].default_value = metallic
+    _MAT_CACHE[key] = mat
     return mat
 
 
-def add_cube(name, size, location, material=None):
-    bpy.ops.mesh.primitive_cube_add(size=1.0, location=location)
-    obj = bpy.context.active_object
-    obj.name = name
-    obj.scale = size
-    if material:
-        obj.data.materials.append(material)
-    return obj
-
-
-def add_cylinder(name, radius, depth, location, rotation=(0, 0, 0), material=None, vertices=32):
-    bpy.ops.mesh.primitive_cylinder_add(vertices=vertices, radius=radius, depth=depth, location=location, rotation=rotation)
-    obj = bpy.context.active_object
-    obj.name = name
-    if material:
-        obj.data.materials.append(material)
-    return obj
-
-
-def add_cone(name, r1, r2, depth, location, rotation=(0, 0, 0), material=None, vertices=24):
-    bpy.ops.mesh.primitive_cone_add(vertices=vertices, radius1=r1, radius2=r2, depth=depth, location=location, rotation=rotation)
-    obj = bpy.context.active_object
-    obj.name = name
-    if material:
-        obj.data.materials.append(material)
-    return obj
+_EEVEE_PREVIEW_SETTINGS = {
+    'taa_render_samples': 8,
+    'use_ssr': False,
+    'use_bloom': False,
+    'use_motion_blur': False,
+    'use_gtao': False,
+}
 
 
 def setup_scene():
@@ -78,16 +123,17 @@ def setup_scene():
     nodes = node_tree.nodes
     links = node_tree.links
 
-    bg = next((node for node in nodes if node.type == 'BACKGROUND'), None)
+    bg = nodes.get('Background')
     if bg is None:
         bg = nodes.new(type='ShaderNodeBackground')
+        bg.name = 'Background'
 
-    out = next((node for node in nodes if node.type == 'OUTPUT_WORLD'), None)
+    out = nodes.get('World Output')
     if out is None:
         out = nodes.new(type='ShaderNodeOutputWorld')
+        out.name = 'World Output'
 
-    is_linked = any(link.from_node == bg and link.to_node == out for link in links)
-    if not is_linked:
+    if not bg.outputs['Background'].is_linked:
         links.new(bg.outputs['Background'], out.inputs['Surface'])
 
     bg.inputs[0].default_value = (0.02, 0.03, 0.06, 1)
@@ -95,17 +141,14 @@ def setup_scene():
 
 
 def build_drone_with_mount(mats):
-    drone_root = bpy.data.objects.new('DroneRoot', None)
-    bpy.context.collection.objects.link(drone_root)
+    # Дрон статичен относительно DroneRoot, поэтому собираем его в один меш
+    drone = _ops_free.MeshAssembly()
 
-    body = add_cube('DroneBody', (0.42, 0.30, 0.07), (0, 0, 2.35), mats['drone'])
-    body.parent = drone_root
+    drone.add_cube((0.42, 0.30, 0.07), (0, 0, 2.35), mats['drone'])
 
     # Руки дрона
-    arm1 = add_cube('ArmX', (0.80, 0.03, 0.02), (0, 0, 2.35), mats['drone'])
-    arm1.parent = drone_root
-    arm2 = add_cube('ArmY', (0.03, 0.80, 0.02), (0, 0, 2.35), mats['drone'])
-    arm2.parent = drone_root
+    drone.add_cube((0.80, 0.03, 0.02), (0, 0, 2.35), mats['drone'])
+    drone.add_cube((0.03, 0.80, 0.02), (0, 0, 2.35), mats['drone'])
 
     motor_positions = [
         (0.68, 0.68, 2.36),
@@ -114,15 +157,11 @@ def build_drone_with_mount(mats):
         (-0.68, -0.68, 2.36),
     ]
 
-    for i, pos in enumerate(motor_positions, start=1):
-        motor = add_cylinder(f'Motor_{i}', 0.06, 0.05, pos, material=mats['dark'])
-        motor.parent = drone_root
-        prop = add_cube(f'Prop_{i}', (0.28, 0.015, 0.005), (pos[0], pos[1], pos[2] + 0.03), mats['dark'])
-        prop.parent = drone_root
+    drone.add_cylinders(0.06, 0.05, motor_positions, mats['dark'])
+    drone.add_cubes((0.28, 0.015, 0.005), [(x, y, z + 0.03) for x, y, z in motor_positions], mats['dark'])
 
     # Узел крепления под дроном
-    mount_plate = add_cube('MountPlate', (0.28, 0.20, 0.02), (0, 0, 2.12), mats['metal'])
-    mount_plate.parent = drone_root
+    drone.add_cube((0.28, 0.20, 0.02), (0, 0, 2.12), mats['metal'])
 
     # Направляющие воронки (на дроне)
     guides = [
@@ -131,29 +170,24 @@ def build_drone_with_mount(mats):
         (-0.16, 0.12, 2.04),
         (-0.16, -0.12, 2.04),
     ]
-    for i, g in enumerate(guides, start=1):
-        cone = add_cone(f'DroneGuide_{i}', 0.04, 0.02, 0.09, g, material=mats['metal'])
-        cone.parent = drone_root
+    drone.add_cones(0.04, 0.02, 0.09, guides, mats['metal'])
 
     # Защелки по бокам
-    latch_l = add_cube('Latch_Left', (0.02, 0.05, 0.03), (0, 0.24, 2.10), mats['latch'])
-    latch_r = add_cube('Latch_Right', (0.02, 0.05, 0.03), (0, -0.24, 2.10), mats['latch'])
-    latch_l.parent = drone_root
-    latch_r.parent = drone_root
+    drone.add_cubes((0.02, 0.05, 0.03), [(0, 0.24, 2.10), (0, -0.24, 2.10)], mats['latch'])
 
-    return drone_root
+    return drone.to_object('DroneRoot')
 
 
 def build_box_and_dock(mats):
     # Док-площадка
-    dock = add_cube('DockBase', (0.70, 0.50, 0.03), (0, 0, 0.03), mats['dock'])
+    dock = _ops_free.new_cube('DockBase', (0.70, 0.50, 0.03), (0, 0, 0.03), mats['dock'])
 
-    # Коробка (сменный модуль)
-    box = add_cube('QuickChangeBox', (0.26, 0.18, 0.12), (0, 0, 0.18), mats['box'])
+    # Коробка (сменный модуль) — один меш; детали заданы в локальных координатах коробки
+    box = _ops_free.MeshAssembly()
+    box.add_cube((1, 1, 1), (0, 0, 0), mats['box'])
 
     # Верхняя крышка коробки
-    lid = add_cube('BoxLid', (0.24, 0.16, 0.015), (0, 0, 0.30), mats['box_top'])
-    lid.parent = box
+    box.add_cube((0.24, 0.16, 0.015), (0, 0, 0.30), mats['box_top'])
 
     # Штифты самонаведения на коробке
     pins = [
@@ -162,63 +196,78 @@ def build_box_and_dock(mats):
         (-0.16, 0.12, 0.33),
         (-0.16, -0.12, 0.33),
     ]
-    for i, p in enumerate(pins, start=1):
-        pin = add_cylinder(f'BoxPin_{i}', 0.014, 0.05, p, material=mats['metal'])
-        pin.parent = box
+    box.add_cylinders(0.014, 0.05, pins, mats['metal'])
 
     # Пазы защелок
-    slot_l = add_cube('LatchSlot_Left', (0.025, 0.04, 0.02), (0, 0.20, 0.21), mats['dark'])
-    slot_r = add_cube('LatchSlot_Right', (0.025, 0.04, 0.02), (0, -0.20, 0.21), mats['dark'])
-    slot_l.parent = box
-    slot_r.parent = box
+    box.add_cubes((0.025, 0.04, 0.02), [(0, 0.20, 0.21), (0, -0.20, 0.21)], mats['dark'])
+
+    box = box.to_object('QuickChangeBox', (0, 0, 0.18), (0.26, 0.18, 0.12))
 
     # Стойка-столб для контекста
-    pole = add_cylinder('LampPole', 0.045, 1.7, (1.35, 0, 0.85), material=mats['pole'])
-    head = add_cube('LampHead', (0.22, 0.10, 0.05), (1.50, 0, 1.62), mats['dock'])
+    pole = _ops_free.new_cyl('LampPole', 0.045, 1.7, (1.35, 0, 0.85), mat=mats['pole'])
+    head = _ops_free.new_cube('LampHead', (0.22, 0.10, 0.05), (1.50, 0, 1.62), mats['dock'])
 
     return dock, box
 
 
 def setup_camera_lights():
-    bpy.ops.object.camera_add(location=(3.1, -2.8, 2.0), rotation=(math.radians(72), 0, math.radians(48)))
-    cam = bpy.context.active_object
-    cam.name = 'MainCamera'
+    cam = _ops_free.new_camera('MainCamera', (3.1, -2.8, 2.0), (math.radians(72), 0, math.radians(48)))
     bpy.context.scene.camera = cam
 
-    bpy.ops.object.light_add(type='AREA', location=(1.4, -2.2, 3.0))
-    key = bpy.context.active_object
-    key.data.energy = 1300
-    key.data.size = 2.0
+    _ops_free.new_area_light('KeyLight', (1.4, -2.2, 3.0), 1300, 2.0)
+    _ops_free.new_area_light('FillLight', (-2.2, 1.5, 2.0), 550, 1.6)
 
-    bpy.ops.object.light_add(type='AREA', location=(-2.2, 1.5, 2.0))
-    fill = bpy.context.active_object
-    fill.data.energy = 550
-    fill.data.size = 1.6
 
+def parent_keep_transform(children, parent):
+    # Обратная матрица родителя считается один раз на всю группу детей
+    inv = parent.matrix_world.inverted_safe()
+    for child in children:
+        child.parent = parent
+        child.matrix_parent_inverse = inv
 
-def add_simple_animation(drone_root, box):
-    # Старт: дрон выше, коробка в доке
-    drone_root.location = Vector((0.0, 0.0, 2.0))
-    drone_root.keyframe_insert(data_path='location', frame=1)
 
-    # Подлет к коробке
-    drone_root.location = Vector((0.0, 0.0, 0.6))
-    drone_root.keyframe_insert(data_path='location', frame=40)
+# Траектория дрона: (кадр, x, y, z)
+_DRONE_KEYS = np.array([
+    (1, 0.0, 0.0, 2.0),      # Старт: дрон выше, коробка в доке
+    (40, 0.0, 0.0, 0.6),     # Подлет к коробке
+    (58, 0.0, 0.0, 0.46),    # Захват
+    (100, 0.0, 0.0, 1.9),    # Подъем с коробкой
+], dtype=np.float32)
 
-    # Захват
-    drone_root.location = Vector((0.0, 0.0, 0.46))
-    drone_root.keyframe_insert(data_path='location', frame=58)
 
-    # Подъем с коробкой
-    drone_root.location = Vector((0.0, 0.0, 1.9))
-    drone_root.keyframe_insert(data_path='location', frame=100)
+def _slot_fcurves(anim):
+    # F-кривые назначенного слота: в 4.4+ они лежат в channelbag слота,
+    # Action.fcurves там устарел (и удален в 5.0)
+    if hasattr(anim, 'action_slot'):
+        return anim_utils.action_ensure_channelbag_for_slot(anim.action, anim.action_slot).fcurves
+    return anim.action.fcurves
+
+
+def add_simple_animation(drone_root, box):
+    anim = drone_root.animation_data_create()
+    act = bpy.data.actions.new('DroneAct')
+    anim.action = act
+    if hasattr(act, 'slots'):
+        anim.action_slot = act.slots.new(id_type='OBJECT', name=drone_root.name)
+    fcurves = _slot_fcurves(anim)
+
+    frames = _DRONE_KEYS[:, 0]
+    for i in range(3):
+        fc = fcurves.new(data_path='location', index=i)
+        fc.keyframe_points.add(len(_DRONE_KEYS))
+        coords = np.column_stack((frames, _DRONE_KEYS[:, i + 1])).ravel()
+        fc.keyframe_points.foreach_set('co', coords)
+        fc.update()
 
     # Для демонстрации визуально привязываем коробку к дрону после 58 кадра
-    box.keyframe_insert(data_path='location', frame=57)
+    box.keyframe_insert(data_path='location', frame=57, options={'FAST'})
     box.location = Vector((0.0, 0.0, 0.18))
-    box.parent = drone_root
-    box.matrix_parent_inverse = drone_root.matrix_world.inverted()
-    box.keyframe_insert(data_path='location', frame=58)
+    parent_keep_transform([box], drone_root)
+    box.keyframe_insert(data_path='location', frame=58, options={'FAST'})
+
+    # FAST пропускает пересчет ручек при вставке — пересчитываем один раз в конце
+    for fc in _slot_fcurves(box.animation_data):
+        fc.update()
 
 
 if __name__ == '__main__':
@@ -235,14 +284,36 @@ if __name__ == '__main__':
         'dock': make_material('DockMat', (0.23, 0.28, 0.33), roughness=0.55, metallic=0.25),
         'pole': make_material('PoleMat', (0.75, 0.78, 0.82), roughness=0.5, metallic=0.2),
     }
+    release_material_template()
 
     drone = build_drone_with_mount(materials)
     _, box = build_box_and_dock(materials)
     setup_camera_lights()
+    # Все объекты созданы через bpy.data без depsgraph-апдейтов; один пересчет
+    # перед анимацией, чтобы matrix_world дрона была актуальной для привязки коробки
+    bpy.context.view_layer.update()
     add_simple_animation(drone, box)
 
-    # Авто-рендер одного кадра-превью
-    bpy.context.scene.frame_set(68)
-    bpy.ops.render.render(write_still=True)
-
-    print('Готово: сцена собрана. Превью сохранено в quickchange_dock_preview.png рядом с .blend')
+    scene = bpy.context.scene
+    scene.frame_set(68)
+
+    # Сохраняем до рендера: так «//» в пути превью указывает на каталог .blend,
+    # а настройки превью не попадают в файл
+    args = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    if args:
+        blend_path = os.path.abspath(args[0])
+        bpy.ops.wm.save_as_mainfile(filepath=blend_path)
+        print(f'Сцена сохранена: {blend_path}')
+
+    if os.environ.get('QUICKCHANGE_RENDER_PREVIEW'):
+        # Превью-рендер одного кадра в пониженном разрешении
+        scene.render.resolution_percentage = int(os.environ.get('QUICKCHANGE_RENDER_PERCENT', 25))
+        # Для превью чистой механической сцены эффекты Eevee не нужны;
+        # имена свойств меняются между версиями, поэтому ставим только существующие
+        for attr, value in _EEVEE_PREVIEW_SETTINGS.items():
+            if hasattr(scene.eevee, attr):
+                setattr(scene.eevee, attr, value)
+        bpy.ops.render.render(write_still=True)
+        print('Готово: сцена собрана. Превью сохранено в quickchange_dock_preview.png рядом с .blend')
+    else:
+        print('Готово: сцена собрана. Рендер превью пропущен (QUICKCHANGE_RENDER_PREVIEW не задан)')
@@ -0,0 +1,38 @@
+# Проверка для CI: скрипты сборки сцены не вызывают bpy.ops, кроме разрешенных модулей.
+# Запуск обычным Python, без Blender: python check_ops_free.py
+import ast
+import os
+import sys
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Для рендера и сохранения .blend у bpy.data нет замены
+ALLOWED = {
+    'blender_quickchange_dock_demo.py': {'render', 'wm'},
+    '_ops_free.py': set(),
+}
+
+
+def find_ops(path, allowed):
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), path)
+    return [
+        f'{path}:{node.lineno}: bpy.ops.{node.attr}'
+        for node in ast.walk(tree)
+        if isinstance(node, ast.Attribute)
+        and isinstance(node.value, ast.Attribute)
+        and node.value.attr == 'ops'
+        and isinstance(node.value.value, ast.Name)
+        and node.value.value.id == 'bpy'
+        and node.attr not in allowed
+    ]
+
+
+if __name__ == '__main__':
+    used = []
+    for name, allowed in ALLOWED.items():
+        used += find_ops(os.path.join(base_dir, name), allowed)
+    if used:
+        print('Недопустимые вызовы bpy.ops:\n' + '\n'.join(used))
+        sys.exit(1)
+    print('OK: bpy.ops не используется при сборке сцены')
@@ -9,17 +9,46 @@ os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
 bpy.ops.wm.open_mainfile(filepath=input_path)
 
-# Ensure all objects are considered for export
+# Карта parent -> children строится один раз: obj.children в Blender O(N) на каждый вызов
+children_map = {}
 for obj in bpy.data.objects:
-    obj.select_set(False)
+    children_map.setdefault(obj.parent, []).append(obj)
+
+# Выбираем все видимые объекты, достижимые от корней сцены (пустышки, арматуры,
+# кривые и т.д. тоже нужны экспортеру); камеры не экспортируются (export_cameras=False)
+export_objects = []
+stack = list(children_map.get(None, []))
+while stack:
+    obj = stack.pop()
+    if obj.type != 'CAMERA' and obj.visible_get():
+        export_objects.append(obj)
+    stack.extend(children_map.get(obj, []))
+
+# Выделение меняем только там, где оно расходится с нужным набором,
+# не проходя по всем объектам файла
+export_set = set(export_objects)
+view_layer = bpy.context.view_layer
+view_layer.objects.active = None
+for obj in list(view_layer.objects.selected):
+    if obj not in export_set:
+        obj.select_set(False)
+for obj in export_objects:
+    if not obj.select_get():
+        obj.select_set(True)
 
 bpy.ops.export_scene.gltf(
     filepath=output_path,
     export_format='GLB',
-    use_selection=False,
+    use_selection=True,
+    use_visible=True,
     export_apply=True,
-    export_texcoords=True,
+    # UV не используются (материалы без текстур); Draco уменьшает размер .glb для веба
+    export_texcoords=False,
     export_normals=True,
+    export_draco_mesh_compression_enable=True,
+    export_draco_mesh_compression_level=6,
+    export_draco_position_quantization=14,
+    export_draco_normal_quantization=10,
     export_materials='EXPORT',
     export_cameras=False,
     export_lights=True